@@ -1,16 +1,36 @@
+from collections import Counter
+from uuid import UUID
+
+from django.db import transaction
+from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
-from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from rest_framework_simplejwt import serializers
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
 from rest_framework_simplejwt.views import TokenViewBase
 
 from core.permissions import UserCustomPermissionsSet
-from core.utils import delete_image
+from core.utils import delete_image, delete_images
 from .models import User
-from .serializers import UserSerializer
+from .rehash import counters, current_hash_prefix, outdated_password_count
+from .serializers import BULK_MAX_USERS, UserBulkActionSerializer, UserSerializer
+
+BULK_CHUNK_SIZE = 500
+
+
+def blacklist_outstanding_tokens(user_ids):
+    token_ids = OutstandingToken.objects.filter(
+        user_id__in=user_ids, expires_at__gt=timezone.now(), blacklistedtoken__isnull=True,
+    ).values_list('id', flat=True)
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=token_id) for token_id in token_ids])
 
 
 class UserViewSet(ModelViewSet):
@@ -27,6 +47,54 @@ class UserViewSet(ModelViewSet):
             delete_image(image_id, 'profile')
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @swagger_auto_schema(request_body=UserBulkActionSerializer)
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser], parser_classes=[JSONParser])
+    def bulk(self, request):
+        serializer = UserBulkActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        results = {}
+        if 'ids' in data:
+            ids = []
+            for raw_id in data['ids']:
+                try:
+                    ids.append(str(UUID(raw_id)))
+                except ValueError:
+                    results[raw_id] = 'invalid'
+        else:
+            # One extra row is enough to tell that the filter matches too many users.
+            matches = User.objects.filter(**data['filter']).values_list('id', flat=True)[:BULK_MAX_USERS + 1]
+            ids = [str(pk) for pk in matches]
+            if len(ids) > BULK_MAX_USERS:
+                raise ValidationError({'filter': [f'Matches more than {BULK_MAX_USERS} users; narrow it down.']})
+
+        if str(request.user.id) in ids:
+            results[str(request.user.id)] = 'skipped'
+        ids = [pk for pk in dict.fromkeys(ids) if pk != str(request.user.id)]
+
+        outcome = 'deleted' if data['action'] == 'delete' else 'deactivated'
+        failed_image_deletes = []
+        for offset in range(0, len(ids), BULK_CHUNK_SIZE):
+            chunk = ids[offset:offset + BULK_CHUNK_SIZE]
+            with transaction.atomic():
+                found = {str(pk): image_uuid for pk, image_uuid in
+                         User.objects.filter(pk__in=chunk).values_list('id', 'profile_image_uuid')}
+                blacklist_outstanding_tokens(found)
+                queryset = User.objects.filter(pk__in=found)
+                if data['action'] == 'delete':
+                    queryset.delete()
+                else:
+                    queryset.update(is_active=False)
+
+            results.update((pk, outcome if pk in found else 'not_found') for pk in chunk)
+            if data['action'] == 'delete':
+                failed_image_deletes.extend(
+                    delete_images([str(image_uuid) for image_uuid in found.values() if image_uuid], 'profile'))
+
+        return Response({'summary': Counter(results.values()), 'results': results,
+                         'failed_image_deletes': failed_image_deletes})
+
 
 class TokenObtainPairView(TokenViewBase):
     serializer_class = serializers.TokenObtainPairSerializer
@@ -49,3 +117,18 @@ class TokenObtainPairView(TokenViewBase):
 
 class TokenRefreshView(TokenObtainPairView):
     serializer_class = serializers.TokenRefreshSerializer
+
+
+class PasswordHashStatusView(APIView):
+    """
+    `outdated_accounts` is read from the database and covers every worker. The `rehash` counters belong to the
+    worker process that served this request and reset when it restarts.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'current': current_hash_prefix().rstrip('$'),
+            'outdated_accounts': outdated_password_count(User),
+            'rehash': dict(counters),
+        })
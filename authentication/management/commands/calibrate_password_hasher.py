@@ -0,0 +1,92 @@
+import statistics
+import time
+from pathlib import Path
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher, get_hashers
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.hashers import ConfigurablePBKDF2PasswordHasher
+from authentication.models import User
+from authentication.rehash import outdated_password_count
+
+SETTING = 'PASSWORD_HASHER_ITERATIONS'
+
+
+def time_hash(encode, samples):
+    """Median milliseconds per call of `encode`."""
+    durations = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        encode()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(durations)
+
+
+def write_env(path, iterations):
+    path = Path(path)
+    lines = path.read_text().splitlines() if path.exists() else []
+    lines = [line for line in lines if not line.startswith(f'{SETTING}=')]
+    lines.append(f'{SETTING}={iterations}')
+    path.write_text('\n'.join(lines) + '\n')
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the configured password hashers on this host and recommends a PBKDF2 iteration count '
+            'that meets a per-login latency target.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250, help='Hashing time budget for one login.')
+        parser.add_argument('--min-iterations', type=int, default=600000,
+                            help="Never recommend fewer iterations than this or Django's default, whichever is "
+                                 'higher (OWASP guidance for PBKDF2-SHA256 is 600000).')
+        parser.add_argument('--allow-downgrade', action='store_true',
+                            help="Let --min-iterations go below Django's default. Existing hashes are rewritten "
+                                 'with the lower count on the next login.')
+        parser.add_argument('--samples', type=int, default=5)
+        parser.add_argument('--write-env', metavar='PATH', help=f'Store the recommendation as {SETTING} in PATH.')
+
+    def handle(self, *args, **options):
+        samples = options['samples']
+
+        self.stdout.write('Hasher benchmark (one core):')
+        for hasher in get_hashers():
+            try:
+                salt = hasher.salt()
+                milliseconds = time_hash(lambda: hasher.encode('benchmark-password', salt), samples)
+            except ValueError as error:
+                self.stdout.write(f'  {hasher.algorithm}: unavailable ({error})')
+                continue
+            self.stdout.write(f'  {hasher.algorithm}: {milliseconds:.1f} ms per hash, '
+                              f'{1000 / milliseconds:.1f} logins/s per core')
+
+        preferred = get_hasher()
+        if not isinstance(preferred, ConfigurablePBKDF2PasswordHasher):
+            raise CommandError('The preferred hasher must be authentication.hashers.ConfigurablePBKDF2PasswordHasher.')
+
+        # PBKDF2 cost is linear in the iteration count, so one measurement is enough to scale from.
+        probe = 100000
+        salt = preferred.salt()
+        probe_ms = time_hash(lambda: preferred.encode('benchmark-password', salt, probe), samples)
+        iterations = int(probe * options['target_ms'] / probe_ms) // 10000 * 10000
+        # Hashes are upgraded whenever their count differs from the setting, so a low recommendation would weaken
+        # every account that logs in afterwards.
+        floor = options['min_iterations']
+        if not options['allow_downgrade']:
+            floor = max(floor, PBKDF2PasswordHasher.iterations)
+        iterations = max(iterations, floor)
+        expected_ms = time_hash(lambda: preferred.encode('benchmark-password', salt, iterations), samples)
+
+        self.stdout.write(f'Current: {preferred.iterations} iterations')
+        self.stdout.write(f'Recommended: {SETTING}={iterations} '
+                          f'({expected_ms:.1f} ms per login, {1000 / expected_ms:.1f} logins/s per core)')
+        if iterations == floor and expected_ms > options['target_ms']:
+            self.stdout.write(self.style.WARNING(
+                f"The {options['target_ms']:g} ms target is not reachable above {floor} iterations on this host."))
+
+        self.stdout.write(f'Accounts on outdated hash parameters: {outdated_password_count(User)}')
+
+        if options['write_env']:
+            write_env(options['write_env'], iterations)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {SETTING}={iterations} to {options['write_env']}. "
+                                                 'Outdated hashes are upgraded on the next login.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.clients import sns_publisher
+
+
+class Command(BaseCommand):
+    help = 'Sends SNS messages spooled during an outage, for example from cron after the workers were stopped.'
+
+    def handle(self, *args, **options):
+        pending = sns_publisher.spool.count()
+        sns_publisher.drain()
+        remaining = sns_publisher.spool.count()
+
+        self.stdout.write(f'Replayed {pending - remaining} of {pending} spooled messages.')
+        if remaining:
+            self.stdout.write(self.style.WARNING(
+                f'{remaining} are still spooled, the circuit breaker is {sns_publisher.breaker.state}.'))
@@ -0,0 +1,196 @@
+import random
+from datetime import timedelta
+from contextlib import nullcontext
+from multiprocessing import Lock, Pool
+from uuid import UUID
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.state import token_backend
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from authentication.models import User
+
+FIRST_NAMES = (
+    'James', 'Maria', 'John', 'Ana', 'Robert', 'Mary', 'Michael', 'Linda', 'William', 'Sofia', 'David', 'Laura',
+    'Richard', 'Julia', 'Joseph', 'Emma', 'Thomas', 'Olivia', 'Carlos', 'Camila', 'Daniel', 'Beatriz', 'Matheus',
+    'Isabela', 'Lucas', 'Fernanda', 'Pedro', 'Gabriela', 'Rafael', 'Mariana', 'Kenji', 'Yuki', 'Ahmed', 'Fatima',
+    'Ivan', 'Olga', 'Chen', 'Mei', 'Arjun', 'Priya',
+)
+LAST_NAMES = (
+    'Smith', 'Silva', 'Johnson', 'Santos', 'Williams', 'Oliveira', 'Brown', 'Souza', 'Jones', 'Rodrigues', 'Garcia',
+    'Ferreira', 'Miller', 'Alves', 'Davis', 'Pereira', 'Martinez', 'Lima', 'Lopez', 'Gomes', 'Wilson', 'Costa',
+    'Anderson', 'Ribeiro', 'Taylor', 'Martins', 'Moore', 'Carvalho', 'Abreu', 'Almeida', 'Tanaka', 'Sato', 'Khan',
+    'Ivanov', 'Wang', 'Li', 'Patel', 'Kumar', 'Muller', 'Rossi',
+)
+EMAIL_DOMAINS = ('gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com', 'icloud.com', 'proton.me', 'example.org')
+EMAIL_DOMAIN_WEIGHTS = (45, 15, 12, 10, 8, 3, 7)
+
+# Name popularity roughly follows a Zipf distribution.
+FIRST_NAME_WEIGHTS = [1 / rank for rank in range(1, len(FIRST_NAMES) + 1)]
+LAST_NAME_WEIGHTS = [1 / rank for rank in range(1, len(LAST_NAMES) + 1)]
+
+# SQLite allows a single writer, so pool workers take turns inserting instead of timing out on the write lock.
+_insert_lock = None
+
+# Stays under SQLite's historical limit of 999 bound parameters; bulk_create lowers INSERT_BATCH_SIZE on its own.
+LOOKUP_BATCH_SIZE = 900
+INSERT_BATCH_SIZE = 1000
+
+
+def _uuid(rng):
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def _suffix(seed):
+    return f'-{seed:x}-'
+
+
+def _username(rng, first_name, last_name, seed, index):
+    first, last = first_name.lower(), last_name.lower()
+    pattern = rng.choice((f'{first}.{last}', f'{first}{last}', f'{first[0]}{last}', f'{first}_{last[0]}'))
+
+    # Names never contain a hyphen, so the hexadecimal seed and index keep usernames and emails unique across seeds
+    # without a lookup.
+    return f'{pattern}{_suffix(seed)}{index:x}'
+
+
+def _build_users(rng, start, count, password_hash, now, options):
+    users = []
+    for index in range(start, start + count):
+        first_name = rng.choices(FIRST_NAMES, FIRST_NAME_WEIGHTS)[0]
+        last_name = rng.choices(LAST_NAMES, LAST_NAME_WEIGHTS)[0]
+        username = _username(rng, first_name, last_name, options['seed'], index)
+        domain = rng.choices(EMAIL_DOMAINS, EMAIL_DOMAIN_WEIGHTS)[0]
+        date_joined = now - timedelta(seconds=rng.randrange(3 * 365 * 24 * 3600))
+        has_logged_in = rng.random() < 0.8
+
+        users.append(User(
+            id=_uuid(rng),
+            username=username,
+            email=f'{username}@{domain}',
+            password=password_hash,
+            first_name=first_name,
+            last_name=last_name,
+            is_active=rng.random() < 0.97,
+            date_joined=date_joined,
+            last_login=date_joined + (now - date_joined) * rng.random() if has_logged_in else None,
+            profile_image_uuid=_uuid(rng) if rng.random() < options['image_ratio'] else None,
+        ))
+
+    return users
+
+
+def _build_tokens(rng, users, now, options):
+    tokens, blacklisted_jtis = [], []
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+
+    for user in users:
+        for _ in range(rng.randint(0, options['max_tokens_per_user'])):
+            created_at = now - timedelta(seconds=rng.randrange(int(lifetime.total_seconds())))
+            expires_at = created_at + lifetime
+            jti = _uuid(rng).hex
+            token = token_backend.encode({
+                api_settings.TOKEN_TYPE_CLAIM: 'refresh',
+                'exp': int(expires_at.timestamp()),
+                'iat': int(created_at.timestamp()),
+                api_settings.JTI_CLAIM: jti,
+                api_settings.USER_ID_CLAIM: str(user.id),
+            })
+
+            tokens.append(OutstandingToken(user=user, jti=jti, token=token, created_at=created_at,
+                                           expires_at=expires_at))
+            if rng.random() < options['blacklist_ratio']:
+                blacklisted_jtis.append(jti)
+
+    return tokens, blacklisted_jtis
+
+
+def seed_chunk(chunk):
+    """Generates and inserts one chunk. Each chunk has its own RNG so output does not depend on process count."""
+    chunk_index, start, count, password_hash, now, options = chunk
+    rng = random.Random(f"{options['seed']}:{chunk_index}")
+
+    users = _build_users(rng, start, count, password_hash, now, options)
+    tokens, blacklisted_jtis = _build_tokens(rng, users, now, options)
+
+    with _insert_lock or nullcontext(), transaction.atomic():
+        User.objects.bulk_create(users, batch_size=INSERT_BATCH_SIZE)
+        OutstandingToken.objects.bulk_create(tokens, batch_size=INSERT_BATCH_SIZE)
+
+        blacklisted = []
+        for offset in range(0, len(blacklisted_jtis), LOOKUP_BATCH_SIZE):
+            jtis = blacklisted_jtis[offset:offset + LOOKUP_BATCH_SIZE]
+            token_ids = OutstandingToken.objects.filter(jti__in=jtis).values_list('id', flat=True)
+            blacklisted.extend(BlacklistedToken(token_id=token_id) for token_id in token_ids)
+        BlacklistedToken.objects.bulk_create(blacklisted, batch_size=INSERT_BATCH_SIZE)
+
+    return count, len(tokens), len(blacklisted)
+
+
+def _init_worker(insert_lock):
+    global _insert_lock
+    _insert_lock = insert_lock
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Bulk inserts a deterministic synthetic dataset of users, outstanding and blacklisted refresh tokens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--password', default='123change', help='Password shared by every seeded user.')
+        parser.add_argument('--image-ratio', type=float, default=0.3)
+        parser.add_argument('--max-tokens-per-user', type=int, default=2)
+        parser.add_argument('--blacklist-ratio', type=float, default=0.25)
+
+    def handle(self, *args, **options):
+        # Timestamps are relative to now; everything else is derived from the seed.
+        now = timezone.now()
+        seed_options = {key: options[key] for key in
+                        ('seed', 'image_ratio', 'max_tokens_per_user', 'blacklist_ratio')}
+        password_hash = make_password(options['password'])
+        chunk_size = options['chunk_size']
+        chunks = [
+            (chunk_index, start, min(chunk_size, options['users'] - start), password_hash, now, seed_options)
+            for chunk_index, start in enumerate(range(0, options['users'], chunk_size))
+        ]
+
+        if options['seed'] < 0:
+            raise CommandError('--seed must not be negative.')
+
+        # Every username and email of this seed ends the same way, so one query covers the whole generated range,
+        # including chunks left behind by an interrupted run.
+        suffix = _suffix(options['seed'])
+        seeded = Q(username__regex=f'{suffix}[0-9a-f]+$') | Q(email__regex=f'{suffix}[0-9a-f]+@')
+        if User.objects.filter(seeded).exists():
+            raise CommandError(f"Users of seed {options['seed']} already exist. Delete them or pick another seed.")
+
+        if options['processes'] > 1:
+            insert_lock = Lock() if connection.vendor == 'sqlite' else None
+            connections.close_all()
+            with Pool(options['processes'], initializer=_init_worker, initargs=(insert_lock,)) as pool:
+                results = pool.imap_unordered(seed_chunk, chunks)
+                totals = self._report(results, options['users'])
+        else:
+            totals = self._report(map(seed_chunk, chunks), options['users'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {totals[0]} users, {totals[1]} outstanding tokens and {totals[2]} blacklisted tokens.'))
+
+    def _report(self, results, total_users):
+        totals = [0, 0, 0]
+        for result in results:
+            totals = [total + value for total, value in zip(totals, result)]
+            self.stdout.write(f'{totals[0]}/{total_users} users')
+
+        return totals
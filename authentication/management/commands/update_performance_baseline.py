@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+
+from core.performance import REPEATS, create_fixtures, measure_all, write_baseline
+
+
+class Command(BaseCommand):
+    help = 'Measures every route against a throwaway test database and rewrites core/performance_baseline.json.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeats', type=int, default=REPEATS)
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            baseline = write_baseline(measure_all(create_fixtures(), options['repeats']))
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        for key, budget in baseline.items():
+            self.stdout.write(f"{key}: status {budget['status']}, {budget['queries']} queries, "
+                              f"{budget['sns_calls']} sns calls, {budget['time_ms']} ms")
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(baseline)} budgets.'))
@@ -1,8 +1,11 @@
 from uuid import uuid4
 
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 
+from .rehash import schedule_rehash
+
 
 class UserManager(BaseUserManager):
     def create_user(self, username, email, password, **kwargs):
@@ -36,3 +39,10 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+    def check_password(self, raw_password):
+        # Upgrading an outdated hash costs a full hash plus a write, so it runs after the response instead.
+        def setter(raw_password):
+            schedule_rehash(User, self.pk, self.password, raw_password)
+
+        return check_password(raw_password, self.password, setter)
@@ -0,0 +1,67 @@
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-rehash')
+
+# Both live in the memory of one worker process; outdated_password_count() is the figure that holds across workers.
+counters = Counter()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def schedule_rehash(user_model, pk, encoded, raw_password):
+    """
+    Queues a rehash unless PASSWORD_REHASH_QUEUE_SIZE jobs are already waiting. Queued jobs hold plaintext
+    passwords, so overflow is dropped and counted; the account is upgraded on a later login instead.
+    """
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.PASSWORD_REHASH_QUEUE_SIZE:
+            counters['dropped'] += 1
+            return None
+        _pending += 1
+        counters['scheduled'] += 1
+
+    return executor.submit(_rehash_in_background, user_model, pk, encoded, raw_password)
+
+
+def _rehash_in_background(*args):
+    global _pending
+    try:
+        rehash(*args)
+    finally:
+        connection.close()
+        with _pending_lock:
+            _pending -= 1
+
+
+def rehash(user_model, pk, encoded, raw_password):
+    """
+    Stores a hash with the current parameters, unless the password changed since `encoded` was verified.
+    """
+    try:
+        updated = user_model.objects.filter(pk=pk, password=encoded).update(password=make_password(raw_password))
+        counters['completed' if updated else 'skipped'] += 1
+    except Exception:
+        counters['failed'] += 1
+        logger.exception('Could not rehash the password of user %s', pk)
+
+
+def current_hash_prefix():
+    hasher = get_hasher()
+    iterations = getattr(hasher, 'iterations', None)
+    return f'{hasher.algorithm}${iterations}$' if iterations else f'{hasher.algorithm}$'
+
+
+def outdated_password_count(user_model):
+    """Accounts with a usable password that was not hashed with the preferred hasher's current parameters."""
+    return user_model.objects.exclude(password__startswith='!').exclude(
+        password__startswith=current_hash_prefix()).count()
@@ -43,3 +43,33 @@ class UserSerializer(serializers.ModelSerializer):
         instance.save()
 
         return instance
+
+
+# Largest number of users one bulk request may act on, whether listed by id or matched by a filter.
+BULK_MAX_USERS = 10000
+
+
+class UserBulkFilterSerializer(serializers.Serializer):
+    email__iendswith = serializers.CharField(required=False)
+    username__istartswith = serializers.CharField(required=False)
+    is_active = serializers.BooleanField(required=False)
+    date_joined__lt = serializers.DateTimeField(required=False)
+    date_joined__gte = serializers.DateTimeField(required=False)
+    last_login__lt = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError('Provide at least one filter.')
+        return attrs
+
+
+class UserBulkActionSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=('delete', 'deactivate'))
+    ids = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False,
+                                max_length=BULK_MAX_USERS)
+    filter = UserBulkFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Provide either ids or filter.')
+        return attrs
@@ -1,14 +1,26 @@
-from io import BytesIO
+import tempfile
+from io import BytesIO, StringIO
+from pathlib import Path
 from unittest.mock import patch, call
 from uuid import uuid4
 
+from botocore.exceptions import ClientError
 from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher, make_password
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.clients import sns_publisher
+from core.publisher import Spool
 
 from .apps import AuthConfig
+from .rehash import counters, outdated_password_count, rehash, schedule_rehash
 from .serializers import UserSerializer
 
 
@@ -225,3 +237,226 @@ class TestUserEndpoints(APITestCase):
 
         delete_image_mock.assert_called_once_with(self.sample_user_w_image.profile_image_uuid, 'profile')
         self.assertEqual(delete_response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class TestSeedUsersCommand(TestCase):
+    def seed(self, **options):
+        call_command('seed_users', users=30, chunk_size=10, seed=7, stdout=StringIO(), **options)
+        return list(get_user_model().objects.order_by('username').values_list('id', 'username', 'email',
+                                                                               'profile_image_uuid'))
+
+    def test_should_insert_users_and_tokens(self):
+        users = self.seed()
+
+        self.assertEqual(len(users), 30)
+        self.assertTrue(OutstandingToken.objects.exists())
+        self.assertTrue(BlacklistedToken.objects.exists())
+        self.assertTrue(get_user_model().objects.first().check_password('123change'))
+
+    def test_same_seed_should_generate_same_dataset(self):
+        first_run = self.seed()
+        first_jtis = set(OutstandingToken.objects.values_list('jti', flat=True))
+        get_user_model().objects.all().delete()
+        OutstandingToken.objects.all().delete()
+
+        self.assertEqual(first_run, self.seed())
+        self.assertEqual(first_jtis, set(OutstandingToken.objects.values_list('jti', flat=True)))
+
+    def test_loading_same_seed_twice_should_fail(self):
+        self.seed()
+
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_different_seeds_should_load_side_by_side(self):
+        self.seed()
+        call_command('seed_users', users=30, chunk_size=10, seed=8, stdout=StringIO())
+
+        self.assertEqual(get_user_model().objects.count(), 60)
+
+    def test_partially_loaded_seed_should_be_detected_before_inserting(self):
+        self.seed()
+        remaining_user = get_user_model().objects.order_by('date_joined').last()
+        get_user_model().objects.exclude(pk=remaining_user.pk).delete()
+
+        with self.assertRaises(CommandError):
+            self.seed()
+
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+
+class TestPasswordRehash(APITestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(username='testuser', password='123change', email='test@mail.com')
+        self.outdated_hash = get_hasher().encode('123change', get_hasher().salt(), 1000)
+        user_model.objects.filter(pk=self.user.pk).update(password=self.outdated_hash)
+
+    @override_settings(PASSWORD_HASHER_ITERATIONS=2000)
+    def test_hasher_should_use_configured_iterations(self):
+        self.assertTrue(make_password('123change').startswith('pbkdf2_sha256$2000$'))
+
+    @patch('authentication.models.schedule_rehash')
+    def test_login_should_schedule_rehash_without_updating_hash_inline(self, schedule_rehash_mock):
+        response = self.client.post('/api/token/', {'email': 'test@mail.com', 'password': '123change'})
+        self.user.refresh_from_db()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        schedule_rehash_mock.assert_called_once_with(get_user_model(), self.user.pk, self.outdated_hash, '123change')
+        self.assertEqual(self.user.password, self.outdated_hash)
+
+    @patch('authentication.models.schedule_rehash')
+    def test_login_with_current_hash_should_not_schedule_rehash(self, schedule_rehash_mock):
+        self.user.set_password('123change')
+        self.user.save()
+
+        self.client.post('/api/token/', {'email': 'test@mail.com', 'password': '123change'})
+
+        schedule_rehash_mock.assert_not_called()
+
+    def test_rehash_should_upgrade_outdated_hash(self):
+        self.assertEqual(outdated_password_count(get_user_model()), 1)
+
+        rehash(get_user_model(), self.user.pk, self.outdated_hash, '123change')
+        self.user.refresh_from_db()
+
+        self.assertTrue(self.user.check_password('123change'))
+        self.assertEqual(outdated_password_count(get_user_model()), 0)
+
+    def test_rehash_should_skip_password_changed_in_the_meantime(self):
+        self.user.set_password('newpassword')
+        self.user.save()
+
+        rehash(get_user_model(), self.user.pk, self.outdated_hash, '123change')
+        self.user.refresh_from_db()
+
+        self.assertTrue(self.user.check_password('newpassword'))
+
+    def test_status_should_report_outdated_accounts_to_staff(self):
+        get_user_model().objects.create_superuser(username='superuser', password='123change', email='admin@mail.com')
+        token = self.client.post('/api/token/', {'email': 'admin@mail.com', 'password': '123change'}).data['access']
+
+        response = self.client.get('/api/password-hashes/status/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['outdated_accounts'], 1)
+        self.assertEqual(response.data['current'], f'pbkdf2_sha256${get_hasher().iterations}')
+
+    def test_calibrate_command_should_write_recommendation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env_path = Path(directory) / '.env'
+            env_path.write_text('SECRET_KEY=secret\nPASSWORD_HASHER_ITERATIONS=1\n')
+            stdout = StringIO()
+
+            call_command('calibrate_password_hasher', target_ms=1, min_iterations=20000, allow_downgrade=True,
+                         samples=1, write_env=str(env_path), stdout=stdout)
+
+            self.assertIn('Accounts on outdated hash parameters: 1', stdout.getvalue())
+            self.assertEqual(env_path.read_text(), 'SECRET_KEY=secret\nPASSWORD_HASHER_ITERATIONS=20000\n')
+
+    @patch('authentication.management.commands.calibrate_password_hasher.time_hash', return_value=1000.0)
+    def test_calibrate_command_should_not_recommend_less_than_django_default(self, time_hash_mock):
+        stdout = StringIO()
+
+        call_command('calibrate_password_hasher', target_ms=1, min_iterations=20000, samples=1, stdout=stdout)
+
+        self.assertIn(f'PASSWORD_HASHER_ITERATIONS={PBKDF2PasswordHasher.iterations} ', stdout.getvalue())
+
+    @override_settings(PASSWORD_REHASH_QUEUE_SIZE=0)
+    @patch('authentication.rehash.executor')
+    def test_rehash_queue_overflow_should_be_dropped_and_counted(self, executor_mock):
+        dropped = counters['dropped']
+
+        self.assertIsNone(schedule_rehash(get_user_model(), self.user.pk, self.outdated_hash, '123change'))
+
+        executor_mock.submit.assert_not_called()
+        self.assertEqual(counters['dropped'], dropped + 1)
+
+
+class TestUserBulkAction(APITestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.users = [
+            user_model.objects.create_user(username=f'tenantuser{index}', password='123change',
+                                           email=f'user{index}@tenant.com')
+            for index in range(3)
+        ]
+        self.user_w_image = user_model.objects.create_user(username='imageuser', password='123change',
+                                                           email='image@tenant.com',
+                                                           profile_image_uuid='2ba7a776-6b20-4fc5-8b9d-8d3849e5a848')
+        self.super_user = user_model.objects.create_superuser(username='superuser', password='123change',
+                                                              email='admin@mail.com')
+        self.super_token = str(RefreshToken.for_user(self.super_user).access_token)
+        self.refresh_token = str(RefreshToken.for_user(self.users[0]))
+
+    def bulk(self, payload, token=None):
+        return self.client.post('/api/user/bulk/', payload, format='json',
+                                HTTP_AUTHORIZATION=f'Bearer {token or self.super_token}')
+
+    @patch('authentication.api.delete_images', return_value=[])
+    def test_bulk_delete_should_report_result_per_id(self, delete_images_mock):
+        unknown_id = str(uuid4())
+        ids = [str(self.users[0].id), str(self.user_w_image.id), unknown_id, 'not-a-uuid', str(self.super_user.id)]
+
+        response = self.bulk({'action': 'delete', 'ids': ids})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], {
+            str(self.users[0].id): 'deleted',
+            str(self.user_w_image.id): 'deleted',
+            unknown_id: 'not_found',
+            'not-a-uuid': 'invalid',
+            str(self.super_user.id): 'skipped',
+        })
+        self.assertEqual(response.data['summary'], {'deleted': 2, 'not_found': 1, 'invalid': 1, 'skipped': 1})
+        self.assertFalse(get_user_model().objects.filter(id__in=[self.users[0].id, self.user_w_image.id]).exists())
+        self.assertEqual(response.data['failed_image_deletes'], [])
+        delete_images_mock.assert_called_once_with([str(self.user_w_image.profile_image_uuid)], 'profile')
+
+    @patch('authentication.api.BULK_CHUNK_SIZE', 1)
+    def test_bulk_delete_should_report_rejected_image_deletes_and_finish(self):
+        image_id = str(self.user_w_image.profile_image_uuid)
+        rejected = ClientError({'Error': {'Code': 'AuthorizationError'}, 'ResponseMetadata': {'HTTPStatusCode': 403}},
+                               'PublishBatch')
+        ids = [str(self.user_w_image.id), str(self.users[0].id)]
+
+        with tempfile.TemporaryDirectory() as spool_dir, \
+                patch.object(sns_publisher, 'spool', Spool(Path(spool_dir) / 'sns_spool.log')), \
+                patch('core.clients.sns_client.publish_batch', side_effect=rejected, create=True):
+            response = self.bulk({'action': 'delete', 'ids': ids})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['summary'], {'deleted': 2})
+        self.assertEqual(response.data['failed_image_deletes'], [image_id])
+
+    @patch('authentication.api.delete_images', return_value=[])
+    @patch('authentication.api.BULK_CHUNK_SIZE', 1)
+    def test_bulk_deactivate_by_filter_should_blacklist_refresh_tokens(self, delete_images_mock):
+        response = self.bulk({'action': 'deactivate', 'filter': {'email__iendswith': '@tenant.com'}})
+        refresh_response = self.client.post('/api/token/refresh/', {'refresh': self.refresh_token})
+
+        self.assertEqual(response.data['summary'], {'deactivated': 4})
+        self.assertFalse(get_user_model().objects.filter(email__iendswith='@tenant.com', is_active=True).exists())
+        self.assertEqual(refresh_response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(BlacklistedToken.objects.filter(token__user=self.users[0]).exists())
+        delete_images_mock.assert_not_called()
+
+    @patch('authentication.api.BULK_MAX_USERS', 2)
+    def test_bulk_action_should_reject_filters_matching_too_many_users(self):
+        response = self.bulk({'action': 'delete', 'filter': {'email__iendswith': '@tenant.com'}})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('filter', response.data)
+        self.assertEqual(get_user_model().objects.filter(email__iendswith='@tenant.com').count(), 4)
+
+    def test_bulk_action_should_require_ids_or_filter(self):
+        response = self.bulk({'action': 'delete'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_action_should_be_staff_only(self):
+        token = str(RefreshToken.for_user(self.users[1]).access_token)
+        response = self.bulk({'action': 'delete', 'ids': [str(self.users[0].id)]}, token=token)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(get_user_model().objects.filter(id=self.users[0].id).exists())
@@ -0,0 +1,77 @@
+"""
+Concurrent write throughput of POST /api/user/ against a running server.
+
+Start the server once per database profile (for example with DATABASE_ENGINE=sqlite and then
+DATABASE_ENGINE=postgresql) and run:
+
+    python benchmarks/user_writes.py --url http://127.0.0.1:8000 --requests 500 --concurrency 16 --label sqlite-wal
+
+Every request hashes a password, so run the server with enough gunicorn workers that hashing is not the bottleneck.
+"""
+import argparse
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from uuid import uuid4
+
+
+def create_user(url, run_id, index):
+    payload = urlencode({
+        'username': f'bench-{run_id}-{index}',
+        'email': f'bench-{run_id}-{index}@mail.com',
+        'password': '123change',
+    }).encode()
+    request = Request(f'{url}/api/user/', data=payload, method='POST',
+                      headers={'Content-Type': 'application/x-www-form-urlencoded'})
+
+    start = time.perf_counter()
+    try:
+        with urlopen(request, timeout=60) as response:
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    except URLError:
+        status = 'connection error'
+
+    return status, time.perf_counter() - start
+
+
+def run(url, requests, concurrency):
+    run_id = uuid4().hex[:8]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda index: create_user(url, run_id, index), range(requests)))
+    elapsed = time.perf_counter() - start
+
+    statuses = Counter(status for status, _ in results)
+    latencies = sorted(latency for _, latency in results)
+
+    return {
+        'elapsed': elapsed,
+        'throughput': statuses[201] / elapsed,
+        'statuses': dict(statuses),
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--label', default='default')
+    args = parser.parse_args()
+
+    result = run(args.url.rstrip('/'), args.requests, args.concurrency)
+
+    print(f"{args.label}: {result['throughput']:.1f} users/s created in {result['elapsed']:.2f}s, "
+          f"p50 {result['p50'] * 1000:.0f} ms, p95 {result['p95'] * 1000:.0f} ms, statuses {result['statuses']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+from django.http import FileResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import ViewSet
+
+from core.clients import sns_publisher
+from core.profiling import get_profile_path, list_profiles
+
+
+class ProfileViewSet(ViewSet):
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response(list_profiles())
+
+    def retrieve(self, request, pk=None):
+        path = get_profile_path(pk)
+        if path is None:
+            raise NotFound
+
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+
+class SNSStatusView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(sns_publisher.status())
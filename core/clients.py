@@ -1,11 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from botocore.config import Config
 from decouple import config
+from django.conf import settings
+
+from core.publisher import CircuitBreaker, SNSPublisher, Spool
 
 sns_client_options = {
     'region_name': config('AWS_DEFAULT_REGION'),
     'aws_access_key_id': config('AWS_ACCESS_KEY_ID'),
     'aws_secret_access_key': config('AWS_SECRET_ACCESS_KEY'),
     'endpoint_url': config('AWS_ENDPOINT_URL'),
+    'config': Config(
+        connect_timeout=config('SNS_CONNECT_TIMEOUT', default=1.0, cast=float),
+        read_timeout=config('SNS_READ_TIMEOUT', default=2.0, cast=float),
+        retries={'mode': 'standard', 'total_max_attempts': config('SNS_MAX_ATTEMPTS', default=1, cast=int)},
+    ),
 }
 
 sns_client = boto3.client('sns', **sns_client_options)
+
+sns_publisher = SNSPublisher(
+    sns_client,
+    CircuitBreaker(
+        failure_threshold=config('SNS_BREAKER_FAILURE_THRESHOLD', default=3, cast=int),
+        recovery_timeout=config('SNS_BREAKER_RECOVERY_TIMEOUT', default=30.0, cast=float),
+    ),
+    # Relative paths are resolved against the project root rather than the working directory.
+    Spool(settings.BASE_DIR / config('SNS_SPOOL_PATH', default='sns_spool.log')),
+    replay_executor=ThreadPoolExecutor(max_workers=1, thread_name_prefix='sns-replay'),
+)
+
+# Messages spooled before this process started are replayed without waiting for new traffic.
+if sns_publisher.spool.has_pending():
+    sns_publisher.schedule_replay()
@@ -0,0 +1,165 @@
+import json
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+from unittest.mock import patch
+
+from decouple import config
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, resolve
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.clients import sns_client, sns_publisher
+from core.publisher import Spool
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'performance_baseline.json'
+
+CALLERS = ('anonymous', 'authenticated', 'staff')
+PASSWORD = '123change'
+REPEATS = 3
+TIME_FACTOR = 3
+TIME_SLACK_MS = 100
+
+# Wall time depends on the machine that wrote the baseline, so only query and SNS budgets are enforced by default.
+CHECK_TIME = config('PERFORMANCE_CHECK_TIME', default=False, cast=bool)
+
+Scenario = namedtuple('Scenario', 'name method path data format', defaults=(None, None))
+
+SCENARIOS = (
+    Scenario('documentation', 'get', '/'),
+    Scenario('schema_json', 'get', '/swagger.json'),
+    Scenario('schema_yaml', 'get', '/swagger.yaml'),
+    Scenario('api_root', 'get', '/api/'),
+    Scenario('token_obtain', 'post', '/api/token/', {'email': '{email}', 'password': PASSWORD}),
+    Scenario('token_refresh', 'post', '/api/token/refresh/', {'refresh': '{refresh}'}),
+    Scenario('user_list', 'get', '/api/user/'),
+    Scenario('user_create', 'post', '/api/user/',
+             {'username': 'budgetuser', 'email': 'budget@mail.com', 'password': PASSWORD}),
+    Scenario('user_retrieve', 'get', '/api/user/{user_id}/'),
+    Scenario('user_update', 'put', '/api/user/{user_id}/',
+             {'username': 'renamed', 'email': 'renamed@mail.com', 'password': PASSWORD}),
+    Scenario('user_partial_update', 'patch', '/api/user/{user_id}/', {'first_name': 'Renamed'}),
+    Scenario('user_destroy', 'delete', '/api/user/{user_id}/'),
+    Scenario('user_bulk', 'post', '/api/user/bulk/', {'action': 'delete', 'ids': ['{user_id}']}, 'json'),
+    Scenario('profile_list', 'get', '/api/profile/'),
+    Scenario('profile_retrieve', 'get', '/api/profile/0-00000000/'),
+    Scenario('sns_status', 'get', '/api/sns/status/'),
+    Scenario('password_hash_status', 'get', '/api/password-hashes/status/'),
+)
+
+
+def create_fixtures():
+    user_model = get_user_model()
+    user = user_model.objects.create_user(username='budgetowner', password=PASSWORD, email='owner@mail.com',
+                                          profile_image_uuid='2ba7a776-6b20-4fc5-8b9d-8d3849e5a848')
+    staff = user_model.objects.create_superuser(username='budgetstaff', password=PASSWORD, email='staff@mail.com')
+
+    return {'anonymous': None, 'authenticated': user, 'staff': staff}
+
+
+def _format(value, context):
+    if isinstance(value, list):
+        return [_format(item, context) for item in value]
+    return value.format(**context) if isinstance(value, str) else value
+
+
+def _build_request(scenario, caller, fixtures):
+    user = fixtures[caller] or fixtures['authenticated']
+    refresh = RefreshToken.for_user(user)
+    context = {'user_id': fixtures['authenticated'].id, 'email': user.email, 'refresh': str(refresh)}
+
+    client = APIClient()
+    if fixtures[caller] is not None:
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    data = {key: _format(value, context) for key, value in (scenario.data or {}).items()}
+
+    return client, _format(scenario.path, context), data
+
+
+def measure(scenario, caller, fixtures, repeats=REPEATS):
+    """
+    Runs a scenario `repeats` times, each inside a rolled back transaction, and returns the response status,
+    query count, SNS publish count and fastest wall time in milliseconds. An empty spool keeps messages spooled
+    earlier on this machine from being replayed into the count.
+    """
+    durations = []
+    with tempfile.TemporaryDirectory() as spool_dir, \
+            patch.object(sns_publisher, 'spool', Spool(Path(spool_dir) / 'sns_spool.log')):
+        for _ in range(repeats):
+            with transaction.atomic():
+                client, path, data = _build_request(scenario, caller, fixtures)
+                extra = {'format': scenario.format} if scenario.format else {}
+                with CaptureQueriesContext(connection) as queries, \
+                        patch.object(sns_client, 'publish', return_value={'MessageId': 'budget'}) as publish_mock, \
+                        patch.object(sns_client, 'publish_batch', return_value={'Successful': [], 'Failed': []},
+                                     create=True) as publish_batch_mock:
+                    start = time.perf_counter()
+                    response = getattr(client, scenario.method)(path, data, **extra)
+                    durations.append((time.perf_counter() - start) * 1000)
+                transaction.set_rollback(True)
+
+    sns_calls = publish_mock.call_count + publish_batch_mock.call_count
+    return {'status': response.status_code, 'queries': len(queries), 'sns_calls': sns_calls,
+            'time_ms': min(durations)}
+
+
+def measure_all(fixtures, repeats=REPEATS):
+    return {
+        f'{scenario.name}:{caller}': measure(scenario, caller, fixtures, repeats)
+        for scenario in SCENARIOS for caller in CALLERS
+    }
+
+
+def budget_from(measurement):
+    return {
+        'status': measurement['status'],
+        'queries': measurement['queries'],
+        'sns_calls': measurement['sns_calls'],
+        'time_ms': round(max(measurement['time_ms'] * TIME_FACTOR, measurement['time_ms'] + TIME_SLACK_MS)),
+    }
+
+
+def over_budget(measurement, budget, check_time=CHECK_TIME):
+    # A request that starts failing early usually runs fewer queries, so the outcome is compared first.
+    problems = []
+    if measurement['status'] != budget['status']:
+        problems.append(f"status: {measurement['status']} != {budget['status']}")
+    metrics = ('queries', 'sns_calls', 'time_ms') if check_time else ('queries', 'sns_calls')
+
+    return problems + [
+        f'{metric}: {measurement[metric]:g} > {budget[metric]:g}'
+        for metric in metrics if measurement[metric] > budget[metric]
+    ]
+
+
+def load_baseline():
+    return json.loads(BASELINE_PATH.read_text())
+
+
+def write_baseline(measurements):
+    baseline = {key: budget_from(measurement) for key, measurement in sorted(measurements.items())}
+    BASELINE_PATH.write_text(json.dumps(baseline, indent=2) + '\n')
+
+    return baseline
+
+
+def _walk_routes(patterns, prefix=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk_routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        else:
+            yield (prefix + str(pattern.pattern)).replace('^', '')
+
+
+def uncovered_routes():
+    """Routes outside the admin site and format suffix variants that no scenario exercises."""
+    routes = {route for route in _walk_routes(get_resolver().url_patterns)
+              if not route.startswith('admin/') and 'format' not in route}
+    covered = {resolve(scenario.path.format(user_id='0')).route.replace('^', '') for scenario in SCENARIOS}
+
+    return routes - covered
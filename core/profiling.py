@@ -0,0 +1,138 @@
+import cProfile
+import json
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from core.clients import sns_client
+
+PROFILE_ID_PATTERN = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+_active = threading.local()
+
+
+def _record_sns_call(params, model, **kwargs):
+    calls = getattr(_active, 'sns_calls', None)
+    if calls is not None:
+        calls.append({'operation': model.name, 'topic_arn': params.get('TopicArn')})
+
+
+def _profile_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def _rotate(directory):
+    metadata_files = sorted(directory.glob('*.json'), reverse=True)
+    for metadata_file in metadata_files[settings.PROFILING_MAX_FILES:]:
+        metadata_file.unlink(missing_ok=True)
+        metadata_file.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def save_profile(profiler, metadata):
+    directory = _profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    profile_id = f'{int(time.time() * 1000)}-{uuid4().hex[:8]}'
+    profiler.dump_stats(directory / f'{profile_id}.prof')
+    (directory / f'{profile_id}.json').write_text(json.dumps({'id': profile_id, **metadata}))
+    _rotate(directory)
+
+    return profile_id
+
+
+def list_profiles():
+    directory = _profile_dir()
+    if not directory.exists():
+        return []
+
+    return [json.loads(path.read_text()) for path in sorted(directory.glob('*.json'), reverse=True)]
+
+
+def get_profile_path(profile_id):
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+
+    path = _profile_dir() / f'{profile_id}.prof'
+    return path if path.exists() else None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when a staff user sends the profiling header or when the sampling rate fires.
+    Removed from the middleware chain entirely unless PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+        sns_client.meta.events.register('provide-client-params.sns', _record_sns_call,
+                                        unique_id='core.profiling')
+
+    def __call__(self, request):
+        if self.should_profile(request):
+            return self.profile(request)
+        return self.get_response(request)
+
+    def should_profile(self, request):
+        if self.header in request.META and self.is_staff(request):
+            return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
+
+    @staticmethod
+    def is_staff(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+
+        try:
+            result = JWTAuthentication().authenticate(request)
+        except (AuthenticationFailed, InvalidToken):
+            return False
+
+        return result is not None and result[0].is_staff
+
+    def profile(self, request):
+        queries = []
+
+        def record_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append({'sql': sql, 'duration': time.perf_counter() - start})
+
+        profiler = cProfile.Profile()
+        _active.sns_calls = []
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(record_query):
+                response = profiler.runcall(self.get_response, request)
+        finally:
+            duration = time.perf_counter() - start
+            sns_calls = _active.sns_calls
+            del _active.sns_calls
+
+        profile_id = save_profile(profiler, {
+            'method': request.method,
+            'path': request.path,
+            'status_code': response.status_code,
+            'duration': duration,
+            'created_at': time.time(),
+            'queries': queries,
+            'sns_calls': sns_calls,
+        })
+        response['X-Profile-Id'] = profile_id
+
+        return response
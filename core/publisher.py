@@ -0,0 +1,393 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, recovery_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.failures = 0
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.recovery_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def _transition(self, state):
+        if state != self._state:
+            logger.warning('SNS circuit breaker %s -> %s', self._state, state)
+        self._state = state
+        self._trial_running = False
+
+    def allow_request(self):
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+                self._transition(self.OPEN)
+
+
+class Spool:
+    """
+    Append-only log of publish calls that could not be delivered, one JSON document per line.
+    A sidecar lock file serializes file access across worker processes, and a second one makes sure only one
+    process replays at a time. The network calls of a replay run without holding the file lock, so appends from
+    requests never wait on SNS. A `.state` sidecar keeps the byte offset of the first unsent message and the number
+    of pending ones, so neither replays nor status checks re-read messages that were already sent.
+    """
+
+    # Sent messages are cut from the head once they take up this many bytes and at least half of the file.
+    COMPACT_BYTES = 1024 * 1024
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.dead_letter_path = self.path.with_name(f'{self.path.name}.dead')
+        self._lock_path = self.path.with_name(f'{self.path.name}.lock')
+        self._replay_lock_path = self.path.with_name(f'{self.path.name}.replay.lock')
+        self._state_path = self.path.with_name(f'{self.path.name}.state')
+
+    @contextmanager
+    def _locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _replaying(self):
+        with open(self._replay_lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _append_to(path, message):
+        with open(path, 'a') as spool_file:
+            spool_file.write(json.dumps(message) + '\n')
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+
+    def _read_state(self):
+        if not self.path.exists():
+            return {'offset': 0, 'pending': 0}
+        try:
+            return json.loads(self._state_path.read_text())
+        except (FileNotFoundError, ValueError):
+            # Spools written before the state file existed are counted once.
+            with open(self.path, 'rb') as spool_file:
+                return {'offset': 0, 'pending': sum(1 for line in spool_file if line.strip())}
+
+    def _write_state(self, state):
+        staged = self._state_path.with_name(f'{self._state_path.name}.tmp')
+        staged.write_text(json.dumps(state))
+        os.replace(staged, self._state_path)
+
+    def _read_from(self, offset, limit=None):
+        """Messages from `offset` on, each paired with the offset right after it."""
+        messages = []
+        with open(self.path, 'rb') as spool_file:
+            spool_file.seek(offset)
+            while limit is None or len(messages) < limit:
+                line = spool_file.readline()
+                if not line:
+                    break
+                if line.strip():
+                    messages.append((json.loads(line), spool_file.tell()))
+
+        return messages
+
+    def _consume(self, offset, count):
+        state = self._read_state()
+        size = self.path.stat().st_size
+        if offset >= size:
+            self.path.unlink()
+            self._state_path.unlink(missing_ok=True)
+            return
+
+        if offset >= self.COMPACT_BYTES and offset * 2 >= size:
+            compacted = self.path.with_name(f'{self.path.name}.tmp')
+            with open(self.path, 'rb') as spool_file, open(compacted, 'wb') as compacted_file:
+                spool_file.seek(offset)
+                shutil.copyfileobj(spool_file, compacted_file)
+            os.replace(compacted, self.path)
+            offset = 0
+
+        self._write_state({'offset': offset, 'pending': max(state['pending'] - count, 0)})
+
+    def append(self, message):
+        with self._locked():
+            state = self._read_state()
+            self._append_to(self.path, message)
+            self._write_state({**state, 'pending': state['pending'] + 1})
+
+    def dead_letter(self, message, reason):
+        with self._locked():
+            self._append_to(self.dead_letter_path, {'message': message, 'reason': reason})
+
+    def has_pending(self):
+        return self.path.exists()
+
+    def count(self):
+        with self._locked():
+            return self._read_state()['pending']
+
+    def pending(self):
+        if not self.has_pending():
+            return []
+        with self._locked():
+            return [message for message, _ in self._read_from(self._read_state()['offset'])]
+
+    def replay(self, send, limit=None):
+        """
+        Hands spooled messages to `send` in order until it returns False, then marks the consumed ones as sent.
+        Returns how many were consumed, or 0 when another process is already replaying.
+        """
+        if not self.has_pending():
+            return 0
+
+        with self._replaying() as acquired:
+            if not acquired:
+                return 0
+
+            with self._locked():
+                offset = self._read_state()['offset']
+                messages = self._read_from(offset, limit) if self.has_pending() else []
+
+            consumed = 0
+            for message, end in messages:
+                if not send(message):
+                    break
+                consumed += 1
+                offset = end
+
+            if consumed:
+                # Messages appended while sending are past `offset`, so they stay pending.
+                with self._locked():
+                    self._consume(offset, consumed)
+
+        return consumed
+
+
+def is_outage(error):
+    if isinstance(error, ClientError):
+        return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500
+    return isinstance(error, BotoCoreError)
+
+
+class SNSPublisher:
+    """
+    Publishes through a circuit breaker. While the spool holds messages, new ones are appended behind them so
+    delivery order is kept, and the spool is drained by `replay_executor` (inline when it is None). With an
+    executor, a spool that could not be drained is retried every `retry_interval` seconds (the breaker's recovery
+    timeout by default), so it is sent once SNS recovers even if no new message arrives.
+    """
+
+    def __init__(self, client, breaker, spool, replay_batch_size=100, replay_executor=None, retry_interval=None):
+        self.client = client
+        self.breaker = breaker
+        self.spool = spool
+        self.replay_batch_size = replay_batch_size
+        self.replay_executor = replay_executor
+        self.retry_interval = breaker.recovery_timeout if retry_interval is None else retry_interval
+        self._replay_future = None
+        self._retry_timer = None
+        self._replay_lock = threading.Lock()
+
+    def publish(self, **kwargs):
+        if self.spool.has_pending():
+            self.spool.append(kwargs)
+            self.schedule_replay()
+            return None
+
+        if not self.breaker.allow_request():
+            self.spool.append(kwargs)
+            self._retry_later()
+            return None
+
+        try:
+            response = self.client.publish(**kwargs)
+        except (BotoCoreError, ClientError) as error:
+            if not is_outage(error):
+                self.breaker.record_success()
+                raise
+            self.breaker.record_failure()
+            self.spool.append(kwargs)
+            self._retry_later()
+            return None
+
+        self.breaker.record_success()
+
+        return response
+
+    def publish_batch(self, TopicArn, Messages):
+        """
+        Publishes up to 10 messages in one PublishBatch call. Entries that fail because of an outage are spooled as
+        individual publish calls, so the spool format stays the same. Messages SNS rejects are logged and returned.
+        """
+        if not hasattr(self.client, 'publish_batch'):
+            # PublishBatch needs botocore 1.23.13 or newer.
+            return self._publish_each(TopicArn, Messages)
+
+        if self.spool.has_pending():
+            self._spool_messages(TopicArn, Messages)
+            self.schedule_replay()
+            return []
+
+        if not self.breaker.allow_request():
+            self._spool_messages(TopicArn, Messages)
+            self._retry_later()
+            return []
+
+        entries = [{'Id': str(index), 'Message': message} for index, message in enumerate(Messages)]
+        try:
+            response = self.client.publish_batch(TopicArn=TopicArn, PublishBatchRequestEntries=entries)
+        except (BotoCoreError, ClientError) as error:
+            if not is_outage(error):
+                self.breaker.record_success()
+                logger.error('SNS rejected a batch of %d messages: %s', len(Messages), error)
+                return list(Messages)
+            self.breaker.record_failure()
+            self._spool_messages(TopicArn, Messages)
+            self._retry_later()
+            return []
+
+        self.breaker.record_success()
+        failed = response.get('Failed', [])
+        rejected = [Messages[int(entry['Id'])] for entry in failed if entry.get('SenderFault')]
+        if rejected:
+            logger.error('SNS rejected %d of %d batch entries: %s', len(rejected), len(entries),
+                         [entry.get('Code') for entry in failed if entry.get('SenderFault')])
+        retryable = [Messages[int(entry['Id'])] for entry in failed if not entry.get('SenderFault')]
+        if retryable:
+            self._spool_messages(TopicArn, retryable)
+            self._retry_later()
+
+        return rejected
+
+    def _publish_each(self, topic_arn, messages):
+        rejected = []
+        for message in messages:
+            try:
+                self.publish(TopicArn=topic_arn, Message=message)
+            except (BotoCoreError, ClientError) as error:
+                logger.error('SNS rejected a message: %s', error)
+                rejected.append(message)
+
+        return rejected
+
+    def _spool_messages(self, topic_arn, messages):
+        for message in messages:
+            self.spool.append({'TopicArn': topic_arn, 'Message': message})
+
+    def schedule_replay(self):
+        if self.replay_executor is None:
+            self.drain()
+            return
+
+        with self._replay_lock:
+            if self._replay_future is None or self._replay_future.done():
+                self._replay_future = self.replay_executor.submit(self._drain_and_retry)
+
+    def _drain_and_retry(self):
+        self.drain()
+        if self.spool.has_pending():
+            self._retry_later()
+
+    def _retry_later(self):
+        if self.replay_executor is None:
+            return
+
+        with self._replay_lock:
+            if self._retry_timer is None:
+                # A daemon timer never holds up worker shutdown while SNS is down.
+                self._retry_timer = threading.Timer(self.retry_interval, self._retry)
+                self._retry_timer.daemon = True
+                self._retry_timer.start()
+
+    def _retry(self):
+        with self._replay_lock:
+            self._retry_timer = None
+        self.schedule_replay()
+
+    def drain(self):
+        """Replays batches until the spool is empty, the breaker stops us or another process holds the replay."""
+        while self.replay():
+            pass
+
+    def replay(self):
+        return self.spool.replay(self._replay_one, limit=self.replay_batch_size)
+
+    def _replay_one(self, message):
+        if not self.breaker.allow_request():
+            return False
+
+        try:
+            self.client.publish(**message)
+        except (BotoCoreError, ClientError) as error:
+            if is_outage(error):
+                self.breaker.record_failure()
+                return False
+            # A rejected message would block the spool forever, so it is set aside instead.
+            self.breaker.record_success()
+            logger.error('Moving undeliverable SNS message to %s: %s', self.spool.dead_letter_path, error)
+            self.spool.dead_letter(message, str(error))
+            return True
+
+        self.breaker.record_success()
+        return True
+
+    def status(self):
+        return {
+            'state': self.breaker.state,
+            'failures': self.breaker.failures,
+            'spooled': self.spool.count(),
+        }
@@ -1,16 +1,32 @@
 import json
+import tempfile
 import time
 from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
 from pathlib import Path
 from unittest.mock import patch, call, MagicMock
 from uuid import uuid4
 
+from botocore.exceptions import ClientError, EndpointConnectionError
+from botocore.stub import Stubber
 from decouple import config
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.utils import ConnectionHandler
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 
-from core.utils import delete_image, upload_image
+from core.clients import sns_client, sns_publisher
+from core.performance import CALLERS, SCENARIOS, create_fixtures, load_baseline, measure, over_budget, \
+    uncovered_routes
+from core.profiling import list_profiles
+from core.publisher import CircuitBreaker, SNSPublisher, Spool
+from core.utils import delete_image, delete_images, upload_image
 
 
 class TestDocumentationFunctional(TestCase):
@@ -55,8 +71,20 @@ class TestDocumentationFunctional(TestCase):
         self.assertTrue(all(main_div.find_element_by_id(f'operation/{name}') for name in all_operations))
 
 
-class TestUtils(TestCase):
-    @patch('core.utils.sns_client.publish')
+class IsolatedSpoolMixin:
+    """Points the shared publisher at an empty spool so messages left over on this machine cannot leak in."""
+
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        spool_patch = patch.object(sns_publisher, 'spool', Spool(Path(spool_dir.name) / 'sns_spool.log'))
+        spool_patch.start()
+        self.addCleanup(spool_patch.stop)
+        super().setUp()
+
+
+class TestUtils(IsolatedSpoolMixin, TestCase):
+    @patch('core.clients.sns_client.publish')
     def test_delete_image_should_publish_sns_message(self, sns_publish_mock):
         image_id = str(uuid4())
         delete_image(image_id, 'profile')
@@ -69,8 +97,30 @@ class TestUtils(TestCase):
             )
         ])
 
+    @patch('core.clients.sns_client.publish_batch', return_value={'Successful': [], 'Failed': []}, create=True)
+    def test_delete_images_should_publish_sns_batches_of_ten(self, sns_publish_batch_mock):
+        image_ids = [str(uuid4()) for _ in range(12)]
+        self.assertEqual(delete_images(image_ids, 'profile'), [])
+
+        self.assertEqual(sns_publish_batch_mock.call_count, 2)
+        first_batch = sns_publish_batch_mock.call_args_list[0][1]['PublishBatchRequestEntries']
+        self.assertEqual(len(first_batch), 10)
+        self.assertEqual(first_batch[0]['Message'],
+                         json.dumps({'action': 'delete', 'image_id': image_ids[0], 'image_folder': 'profile'}))
+        self.assertEqual(len(sns_publish_batch_mock.call_args_list[1][1]['PublishBatchRequestEntries']), 2)
+
+    @patch('core.clients.sns_client.publish_batch', create=True)
+    def test_delete_images_should_return_rejected_image_ids(self, sns_publish_batch_mock):
+        image_ids = [str(uuid4()) for _ in range(2)]
+        sns_publish_batch_mock.return_value = {
+            'Successful': [{'Id': '0'}],
+            'Failed': [{'Id': '1', 'Code': 'InvalidParameter', 'SenderFault': True}],
+        }
+
+        self.assertEqual(delete_images(image_ids, 'profile'), [image_ids[1]])
+
     @patch('core.utils.uuid4', return_value='idmock')
-    @patch('core.utils.sns_client.publish')
+    @patch('core.clients.sns_client.publish')
     def test_upload_image_should_rename_image_publish_sns_message_and_return_validated_data(self, sns_publish_mock,
                                                                                             uuid_mock):
         file_path = Path(__file__).parent / 'test_dummy_data/test_image.png'
@@ -94,3 +144,412 @@ class TestUtils(TestCase):
         ])
         self.assertIn('profile_image_uuid', result)
         self.assertNotIn('profile_image', result)
+
+
+class TestProfilingMiddleware(IsolatedSpoolMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profile_dir.name,
+                                                   PROFILING_MAX_FILES=2)
+        self.settings_override.enable()
+
+        user_model = get_user_model()
+        self.sample_user = user_model.objects.create_user(username='testuser', password='123change',
+                                                          email='test@mail.com',
+                                                          profile_image_uuid='2ba7a776-6b20-4fc5-8b9d-8d3849e5a848')
+        user_model.objects.create_superuser(username='superuser', password='123change', email='admin@mail.com')
+
+        payload = {'email': 'admin@mail.com', 'password': '123change'}
+        self.super_token = self.client.post('/api/token/', payload).data['access']
+
+        payload = {'email': 'test@mail.com', 'password': '123change'}
+        self.token = self.client.post('/api/token/', payload).data['access']
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.profile_dir.cleanup()
+
+    def test_unprofiled_requests_should_not_write_profiles(self):
+        response = self.client.get('/api/user/', HTTP_AUTHORIZATION=f'Bearer {self.super_token}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(list_profiles(), [])
+
+    def test_staff_request_with_header_should_be_profiled_with_queries(self):
+        response = self.client.get('/api/user/', HTTP_AUTHORIZATION=f'Bearer {self.super_token}', HTTP_X_PROFILE='1')
+        profiles = list_profiles()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['id'], response['X-Profile-Id'])
+        self.assertEqual(profiles[0]['path'], '/api/user/')
+        self.assertTrue(profiles[0]['queries'])
+
+    def test_non_staff_request_with_header_should_not_be_profiled(self):
+        self.client.get(f'/api/user/{self.sample_user.id}/', HTTP_AUTHORIZATION=f'Bearer {self.token}',
+                        HTTP_X_PROFILE='1')
+
+        self.assertEqual(list_profiles(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_should_be_profiled_and_rotated(self):
+        for _ in range(3):
+            self.client.get(f'/api/user/{self.sample_user.id}/')
+
+        self.assertEqual(len(list_profiles()), 2)
+        self.assertEqual(len(list(Path(self.profile_dir.name).glob('*.prof'))), 2)
+
+    def test_sns_calls_should_be_recorded(self):
+        with Stubber(sns_client) as stubber:
+            stubber.add_response('publish', {'MessageId': 'message-id'})
+            self.client.delete(f'/api/user/{self.sample_user.id}/', HTTP_AUTHORIZATION=f'Bearer {self.super_token}',
+                               HTTP_X_PROFILE='1')
+
+        sns_calls = list_profiles()[0]['sns_calls']
+        self.assertEqual(sns_calls, [{'operation': 'Publish', 'topic_arn': config('IMAGE_TOPIC_ARN')}])
+
+    def test_staff_should_list_and_download_profiles(self):
+        profile_id = self.client.get('/api/user/', HTTP_AUTHORIZATION=f'Bearer {self.super_token}',
+                                     HTTP_X_PROFILE='1')['X-Profile-Id']
+
+        list_response = self.client.get('/api/profile/', HTTP_AUTHORIZATION=f'Bearer {self.super_token}')
+        download_response = self.client.get(f'/api/profile/{profile_id}/',
+                                            HTTP_AUTHORIZATION=f'Bearer {self.super_token}')
+
+        self.assertEqual(list_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list_response.data[0]['id'], profile_id)
+        self.assertEqual(download_response.status_code, status.HTTP_200_OK)
+        self.assertTrue(b''.join(download_response.streaming_content))
+
+    def test_non_staff_should_not_access_profiles(self):
+        response = self.client.get('/api/profile/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unknown_profile_should_return_404(self):
+        response = self.client.get('/api/profile/unknown/', HTTP_AUTHORIZATION=f'Bearer {self.super_token}')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FaultInjectingSNSStub:
+    def __init__(self):
+        self.faults = []
+        self.published = []
+
+    def publish(self, **kwargs):
+        if self.faults:
+            raise self.faults.pop(0)
+        self.published.append(kwargs)
+        return {'MessageId': str(len(self.published))}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        if self.faults:
+            raise self.faults.pop(0)
+        for entry in PublishBatchRequestEntries:
+            self.published.append({'TopicArn': TopicArn, 'Message': entry['Message']})
+        return {'Successful': [{'Id': entry['Id']} for entry in PublishBatchRequestEntries], 'Failed': []}
+
+
+class LegacySNSStub:
+    """botocore releases before 1.23.13 do not generate a publish_batch method."""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, **kwargs):
+        self.published.append(kwargs)
+        return {'MessageId': str(len(self.published))}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSNSPublisher(TestCase):
+    def setUp(self):
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.client = FaultInjectingSNSStub()
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=self.clock)
+        self.spool = Spool(Path(self.spool_dir.name) / 'sns_spool.log')
+        self.publisher = SNSPublisher(self.client, self.breaker, self.spool)
+
+    def tearDown(self):
+        self.spool_dir.cleanup()
+
+    @staticmethod
+    def connection_error():
+        return EndpointConnectionError(endpoint_url='http://localhost:4100')
+
+    def test_publish_should_reach_client_when_closed(self):
+        response = self.publisher.publish(TopicArn='topic', Message='1')
+
+        self.assertEqual(response, {'MessageId': '1'})
+        self.assertEqual(self.client.published, [{'TopicArn': 'topic', 'Message': '1'}])
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_breaker_should_open_after_threshold_and_spool_messages(self):
+        self.client.faults = [self.connection_error(), self.connection_error()]
+
+        for message in ('1', '2', '3'):
+            self.publisher.publish(TopicArn='topic', Message=message)
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.client.published, [])
+        self.assertEqual([message['Message'] for message in self.spool.pending()], ['1', '2', '3'])
+
+    def test_breaker_should_half_open_after_recovery_timeout_and_replay_spool(self):
+        self.client.faults = [self.connection_error(), self.connection_error()]
+        self.publisher.publish(TopicArn='topic', Message='1')
+        self.publisher.publish(TopicArn='topic', Message='2')
+
+        self.clock.now = 30
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+        self.publisher.publish(TopicArn='topic', Message='3')
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual([message['Message'] for message in self.client.published], ['1', '2', '3'])
+        self.assertEqual(self.spool.pending(), [])
+
+    def test_failed_half_open_trial_should_reopen_breaker(self):
+        self.client.faults = [self.connection_error(), self.connection_error(), self.connection_error()]
+        self.publisher.publish(TopicArn='topic', Message='1')
+        self.publisher.publish(TopicArn='topic', Message='2')
+
+        self.clock.now = 30
+        self.publisher.publish(TopicArn='topic', Message='3')
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(len(self.spool.pending()), 3)
+
+    def test_client_errors_should_be_raised_without_opening_breaker(self):
+        error = ClientError({'Error': {'Code': 'NotFound'}, 'ResponseMetadata': {'HTTPStatusCode': 404}}, 'Publish')
+        self.client.faults = [error, error]
+
+        for _ in range(2):
+            with self.assertRaises(ClientError):
+                self.publisher.publish(TopicArn='topic', Message='1')
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.spool.pending(), [])
+
+    def test_spool_should_survive_new_publisher_instances(self):
+        self.client.faults = [self.connection_error()]
+        self.publisher.publish(TopicArn='topic', Message='1')
+
+        publisher = SNSPublisher(self.client, CircuitBreaker(failure_threshold=2, recovery_timeout=30),
+                                 Spool(self.spool.path))
+        publisher.publish(TopicArn='topic', Message='2')
+
+        self.assertEqual([message['Message'] for message in self.client.published], ['1', '2'])
+
+    def test_failed_batch_should_be_spooled_as_single_messages_and_replayed(self):
+        self.client.faults = [self.connection_error()]
+        self.publisher.publish_batch(TopicArn='topic', Messages=['1', '2'])
+
+        self.assertEqual(self.spool.pending(), [{'TopicArn': 'topic', 'Message': '1'},
+                                                {'TopicArn': 'topic', 'Message': '2'}])
+
+        self.publisher.publish_batch(TopicArn='topic', Messages=['3'])
+
+        self.assertEqual([message['Message'] for message in self.client.published], ['1', '2', '3'])
+
+    def test_rejected_spooled_message_should_be_dead_lettered_without_blocking_the_spool(self):
+        rejected = ClientError({'Error': {'Code': 'InvalidParameter'}, 'ResponseMetadata': {'HTTPStatusCode': 400}},
+                               'Publish')
+        self.client.faults = [self.connection_error(), rejected]
+        self.publisher.publish(TopicArn='topic', Message='1')
+
+        self.publisher.publish(TopicArn='topic', Message='2')
+
+        self.assertEqual([message['Message'] for message in self.client.published], ['2'])
+        self.assertEqual(self.spool.pending(), [])
+        dead_letters = [json.loads(line) for line in self.spool.dead_letter_path.read_text().splitlines()]
+        self.assertEqual([letter['message']['Message'] for letter in dead_letters], ['1'])
+
+    def test_replay_should_run_on_the_replay_executor(self):
+        executor = MagicMock()
+        publisher = SNSPublisher(self.client, self.breaker, self.spool, replay_executor=executor, retry_interval=60)
+        self.client.faults = [self.connection_error()]
+        publisher.publish(TopicArn='topic', Message='1')
+        self.addCleanup(publisher._retry_timer.cancel)
+
+        publisher.publish(TopicArn='topic', Message='2')
+
+        executor.submit.assert_called_once_with(publisher._drain_and_retry)
+        self.assertEqual(self.client.published, [])
+        self.assertEqual(len(self.spool.pending()), 2)
+
+    def test_batch_sender_faults_should_be_returned_instead_of_spooled(self):
+        self.client.publish_batch = lambda TopicArn, PublishBatchRequestEntries: {
+            'Successful': [{'Id': '0'}],
+            'Failed': [{'Id': '1', 'Code': 'InvalidParameter', 'SenderFault': True},
+                       {'Id': '2', 'Code': 'InternalError', 'SenderFault': False}],
+        }
+
+        rejected = self.publisher.publish_batch(TopicArn='topic', Messages=['1', '2', '3'])
+
+        self.assertEqual(rejected, ['2'])
+        self.assertEqual(self.spool.pending(), [{'TopicArn': 'topic', 'Message': '3'}])
+
+    def test_rejected_batch_should_be_returned_without_raising(self):
+        self.client.faults = [ClientError({'Error': {'Code': 'AuthorizationError'},
+                                           'ResponseMetadata': {'HTTPStatusCode': 403}}, 'PublishBatch')]
+
+        rejected = self.publisher.publish_batch(TopicArn='topic', Messages=['1', '2'])
+
+        self.assertEqual(rejected, ['1', '2'])
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.spool.pending(), [])
+
+    def test_batch_should_fall_back_to_single_publishes_without_publish_batch(self):
+        client = LegacySNSStub()
+        publisher = SNSPublisher(client, self.breaker, self.spool)
+
+        rejected = publisher.publish_batch(TopicArn='topic', Messages=['1', '2'])
+
+        self.assertEqual(rejected, [])
+        self.assertEqual([message['Message'] for message in client.published], ['1', '2'])
+
+    def test_spool_should_be_retried_without_new_traffic(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        publisher = SNSPublisher(self.client, self.breaker, self.spool, replay_executor=executor, retry_interval=0.01)
+        self.client.faults = [self.connection_error()]
+
+        publisher.publish(TopicArn='topic', Message='1')
+
+        for _ in range(200):
+            if not self.spool.has_pending():
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.client.published, [{'TopicArn': 'topic', 'Message': '1'}])
+
+    def test_replay_should_resume_from_the_recorded_offset(self):
+        for message in ('1', '2', '3'):
+            self.spool.append({'TopicArn': 'topic', 'Message': message})
+
+        self.spool.replay(lambda message: message['Message'] != '2')
+
+        self.assertEqual(self.spool.count(), 2)
+        self.assertEqual([message['Message'] for message in self.spool.pending()], ['2', '3'])
+        self.spool.replay(lambda message: True)
+        self.assertFalse(self.spool.has_pending())
+
+    @patch.object(Spool, 'COMPACT_BYTES', 1)
+    def test_replay_should_compact_sent_messages(self):
+        for message in ('1', '2', '3'):
+            self.spool.append({'TopicArn': 'topic', 'Message': message})
+
+        self.spool.replay(lambda message: True, limit=2)
+
+        self.assertEqual(self.spool.path.read_text(), json.dumps({'TopicArn': 'topic', 'Message': '3'}) + '\n')
+        self.assertEqual([message['Message'] for message in self.spool.pending()], ['3'])
+
+    def test_replay_command_should_drain_the_spool(self):
+        self.spool.append({'TopicArn': 'topic', 'Message': '1'})
+        stdout = StringIO()
+
+        with patch.multiple(sns_publisher, client=self.client, spool=self.spool):
+            call_command('replay_sns_spool', stdout=stdout)
+
+        self.assertIn('Replayed 1 of 1 spooled messages.', stdout.getvalue())
+        self.assertEqual(self.client.published, [{'TopicArn': 'topic', 'Message': '1'}])
+
+    def test_status_should_report_state_and_spool_size(self):
+        self.client.faults = [self.connection_error(), self.connection_error()]
+        self.publisher.publish(TopicArn='topic', Message='1')
+        self.publisher.publish(TopicArn='topic', Message='2')
+
+        self.assertEqual(self.publisher.status(), {'state': 'open', 'failures': 2, 'spooled': 2})
+
+
+class TestPerformanceBudgets(TestCase):
+    """
+    Regenerate the baseline on purpose with `python manage.py update_performance_baseline`. Time budgets are only
+    enforced with PERFORMANCE_CHECK_TIME=True, on the machine the baseline was written on.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixtures = create_fixtures()
+        cls.baseline = load_baseline()
+
+    def test_every_route_should_have_a_scenario(self):
+        self.assertEqual(uncovered_routes(), set())
+
+    def test_every_scenario_should_have_a_budget(self):
+        keys = {f'{scenario.name}:{caller}' for scenario in SCENARIOS for caller in CALLERS}
+
+        self.assertEqual(keys, set(self.baseline))
+
+    def test_every_scenario_should_stay_within_budget(self):
+        for scenario in SCENARIOS:
+            for caller in CALLERS:
+                key = f'{scenario.name}:{caller}'
+                with self.subTest(key):
+                    self.assertEqual(over_budget(measure(scenario, caller, self.fixtures), self.baseline[key]), [])
+
+    def test_over_budget_should_report_exceeded_metrics(self):
+        budget = {'status': 200, 'queries': 2, 'sns_calls': 0, 'time_ms': 100}
+        measurement = {'status': 200, 'queries': 3, 'sns_calls': 0, 'time_ms': 50.5}
+
+        self.assertEqual(over_budget(measurement, budget), ['queries: 3 > 2'])
+
+    def test_over_budget_should_report_changed_status_even_with_fewer_queries(self):
+        budget = {'status': 200, 'queries': 4, 'sns_calls': 0, 'time_ms': 100}
+        measurement = {'status': 400, 'queries': 1, 'sns_calls': 0, 'time_ms': 10}
+
+        self.assertEqual(over_budget(measurement, budget), ['status: 400 != 200'])
+
+    def test_over_budget_should_only_check_time_when_enabled(self):
+        budget = {'status': 200, 'queries': 2, 'sns_calls': 0, 'time_ms': 100}
+        measurement = {'status': 200, 'queries': 2, 'sns_calls': 0, 'time_ms': 150}
+
+        self.assertEqual(over_budget(measurement, budget, check_time=False), [])
+        self.assertEqual(over_budget(measurement, budget, check_time=True), ['time_ms: 150 > 100'])
+
+    def test_spooled_messages_should_not_count_towards_sns_calls(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        spool = Spool(Path(spool_dir.name) / 'sns_spool.log')
+        spool.append({'TopicArn': 'topic', 'Message': 'left over'})
+        scenario = next(scenario for scenario in SCENARIOS if scenario.name == 'user_destroy')
+
+        with patch.object(sns_publisher, 'spool', spool):
+            measurement = measure(scenario, 'staff', self.fixtures, repeats=1)
+
+        self.assertEqual(measurement['sns_calls'], 1)
+        self.assertEqual(len(spool.pending()), 1)
+
+
+class TestSQLiteBackend(TestCase):
+    def setUp(self):
+        self.database_dir = tempfile.TemporaryDirectory()
+        database = {**settings.DATABASES['default'], 'NAME': str(Path(self.database_dir.name) / 'db.sqlite3')}
+        self.connection = ConnectionHandler({'default': database})['default']
+
+    def tearDown(self):
+        self.connection.close()
+        self.database_dir.cleanup()
+
+    def test_pragmas_should_be_applied_on_connect(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous')
+            synchronous = cursor.fetchone()[0]
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(synchronous, 1)
+        self.assertEqual(busy_timeout, 20000)
@@ -21,7 +21,8 @@ from rest_framework import permissions
 from rest_framework.routers import DefaultRouter
 
 from authentication.routes import router as user_router
-from authentication.api import TokenObtainPairView, TokenRefreshView
+from authentication.api import PasswordHashStatusView, TokenObtainPairView, TokenRefreshView
+from core.api import ProfileViewSet, SNSStatusView
 
 
 schema_view = get_schema_view(
@@ -40,6 +41,7 @@ schema_view = get_schema_view(
 # Register your routers here
 router = DefaultRouter()
 router.registry.extend(user_router.registry)
+router.register(r'profile', ProfileViewSet, basename='profile')
 # ---------------------------
 
 
@@ -51,4 +53,6 @@ urlpatterns = [
     path(r'api/', include(router.urls)),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/sns/status/', SNSStatusView.as_view(), name='sns_status'),
+    path('api/password-hashes/status/', PasswordHashStatusView.as_view(), name='password_hash_status'),
 ]
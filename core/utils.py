@@ -1,19 +1,42 @@
 import json
+import logging
 from base64 import b64encode
 from uuid import uuid4
 
 from decouple import config
 
-from core.clients import sns_client
+from core.clients import sns_publisher
+
+logger = logging.getLogger(__name__)
+
+# SNS PublishBatch accepts at most 10 entries per call.
+SNS_BATCH_SIZE = 10
 
 
 def delete_image(image_id, image_folder):
-    sns_client.publish(
+    sns_publisher.publish(
         TopicArn=config('IMAGE_TOPIC_ARN'),
         Message=json.dumps({'action': 'delete', 'image_id': image_id, 'image_folder': image_folder}),
     )
 
 
+def delete_images(image_ids, image_folder):
+    """Publishes delete messages in batches and returns the ids of the images SNS rejected."""
+    messages = [json.dumps({'action': 'delete', 'image_id': image_id, 'image_folder': image_folder})
+                for image_id in image_ids]
+
+    rejected = []
+    for offset in range(0, len(messages), SNS_BATCH_SIZE):
+        batch = messages[offset:offset + SNS_BATCH_SIZE]
+        rejected.extend(sns_publisher.publish_batch(TopicArn=config('IMAGE_TOPIC_ARN'), Messages=batch))
+
+    failed = [json.loads(message)['image_id'] for message in rejected]
+    if failed:
+        logger.error('Could not request deletion of %s images: %s', image_folder, ', '.join(failed))
+
+    return failed
+
+
 def upload_image(validated_data, image_folder):
     image = validated_data.pop(f'{image_folder}_image')
     image.name = str(uuid4())
@@ -22,7 +45,7 @@ def upload_image(validated_data, image_folder):
     image_bytes = image.read()
     image_base64 = b64encode(image_bytes)
 
-    sns_client.publish(
+    sns_publisher.publish(
         TopicArn=config('IMAGE_TOPIC_ARN'),
         Message=json.dumps(
             {'action': 'upload', 'image_base64': image_base64.decode('utf-8'), 'image_id': image.name,